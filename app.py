@@ -17,11 +17,17 @@ Created: June 2025
 import streamlit as st
 from io import BytesIO
 from datetime import datetime
-from openpyxl import load_workbook
+from itertools import islice
+try:  # fastpyxl is an API-compatible, faster fork of openpyxl
+    from fastpyxl import load_workbook
+except ImportError:
+    from openpyxl import load_workbook
 
 # Backend code
 from automation_test1 import generate_master_datasheet  # Phase‑1 generator
 from populate_syscad_inputs_rev2 import populate_syscad_inputs  # Phase‑2 backend (per‑equipment mapping)
+from streamtable_reader import read_streamtable, streamtable_sheetnames
+from syscad_utils import scan_syscad_block
 
 # Page configuration
 st.set_page_config(page_title="Master Datasheet Automation", page_icon="📄", layout="wide")
@@ -54,6 +60,50 @@ page = st.sidebar.radio("Choose a page", ("Generate Master Datasheet", "SysCAD p
 #     ("Generate Master Datasheet", "SysCAD parameters- Map & Populate"),
 #     index=0 if st.session_state["page"] == "Generate Master Datasheet" else 1,
 # )
+
+# --------------------------------------------------
+# Upload handling and cached workbook analysis
+# --------------------------------------------------
+
+def upload_bytes(upload, key):
+    """
+    Returns the raw bytes of an uploaded file, kept in session_state under `key`
+    and only re-read when a different file (new file_id) is uploaded.
+    """
+    if st.session_state.get(f"{key}_id") != upload.file_id:
+        st.session_state[f"{key}_id"] = upload.file_id
+        st.session_state[key] = upload.getvalue()
+    return st.session_state[key]
+
+
+@st.cache_data(show_spinner=False)
+def analyse_workbooks(master_data: bytes, stream_data: bytes):
+    """
+    Returns ({equipment: (syscad_params, stream_tags)}, missing_equipment).
+    Cached on the raw file bytes so widget reruns don't re-parse either workbook.
+    """
+    master_wb = load_workbook(BytesIO(master_data), read_only=True, data_only=True, keep_links=False)
+    try:
+        master_equipment = set(master_wb.sheetnames)
+        stream_equipment = set(streamtable_sheetnames(stream_data))
+        common_equipment = sorted(master_equipment & stream_equipment)
+        missing_equipment = sorted(master_equipment - stream_equipment)
+        stream_sheets = read_streamtable(stream_data, common_equipment)
+
+        # equipment → (SysCAD params from master, tags from streamtable column C)
+        equipment_data = {}
+        for equip in common_equipment:
+            _, _, syscad_params = scan_syscad_block(master_wb[equip])
+            param_list = list(syscad_params)
+            tag_list = sorted({row[2].strip() for row in islice(stream_sheets[equip], 2, None) if len(row) > 2 and row[2]})
+            equipment_data[equip] = (param_list, tag_list)
+    finally:
+        # read-only workbooks keep the zip archive open until closed
+        master_wb.close()
+
+    return equipment_data, missing_equipment
+
+
 # ==================================================
 # PAGE 1 – GENERATE MASTER DATASHEET
 # ==================================================
@@ -117,44 +167,25 @@ if page == "SysCAD parameters- Map & Populate":
 
     # Resolve master sheet bytes
     if master_option.startswith("Use"):
-        master_bytes = st.session_state.get("generated_master")
+        generated = st.session_state.get("generated_master")
+        master_data = generated.getvalue() if generated is not None else None
     else:
         master_upload = st.file_uploader("Upload master sheet", type=["xlsx"], key="master_file")
-        master_bytes = BytesIO(master_upload.read()) if master_upload else None
+        master_data = upload_bytes(master_upload, "master_data") if master_upload else None
 
-    if not master_bytes or not stream_upload:
+    if not master_data or not stream_upload:
         st.info("Please provide **both** master datasheet and streamtable to continue.")
         st.stop()
 
-    stream_bytes = BytesIO(stream_upload.read())
+    stream_data = upload_bytes(stream_upload, "stream_data")
 
     # ---------- Analyse workbooks ----------
-    master_wb = load_workbook(master_bytes, read_only=True)
-    stream_wb = load_workbook(stream_bytes, read_only=True, data_only=True)
-
-    master_equipment = set(master_wb.sheetnames)
-    stream_equipment = set(stream_wb.sheetnames)
-    common_equipment = sorted(master_equipment & stream_equipment)
-    missing_equipment = sorted(master_equipment - stream_equipment)
+    equipment_data, missing_equipment = analyse_workbooks(master_data, stream_data)
+    common_equipment = sorted(equipment_data)
 
     if missing_equipment:
         st.warning("❗ Equipment sheets missing in streamtable that are available in the Master Datasheet: " + ", ".join(missing_equipment))
 
-    # ---------- Helper to extract SysCAD parameters ----------
-    def extract_syscad_params(ws):
-        params, in_syscad = [], False
-        for r in range(1, ws.max_row + 1):
-            cell_val = ws.cell(row=r, column=1).value
-            if cell_val and "SysCAD Inputs" in str(cell_val):
-                in_syscad = True
-            if in_syscad:
-                if cell_val and "Engineering Inputs" in str(cell_val):
-                    break
-                p = ws.cell(row=r, column=2).value
-                if p:
-                    params.append(p.strip())
-        return params
-
     # ---------- Build mapping UI ----------
     st.subheader("Map parameters for each equipment type")
     st.markdown("Select a streamtable **tag** for every SysCAD Input parameter. Leave blank to skip.")
@@ -163,11 +194,7 @@ if page == "SysCAD parameters- Map & Populate":
         st.session_state["tmp_mapping"] = {}
 
     for equip in common_equipment:
-        master_ws = master_wb[equip]
-        stream_ws = stream_wb[equip]
-
-        param_list = extract_syscad_params(master_ws)
-        tag_list = sorted({row[2].value.strip() for row in stream_ws.iter_rows(min_row=3, max_col=3) if row[2].value})
+        param_list, tag_list = equipment_data[equip]
 
         if not param_list:
             st.info(f"⚠️  SysCAD parameters not found in **{equip}** Master Datasheet. Skipping.")
@@ -178,13 +205,15 @@ if page == "SysCAD parameters- Map & Populate":
 
         st.subheader(equip)
         eq_map = st.session_state["tmp_mapping"].setdefault(equip, {})
+        options = ["— skip —", *tag_list]
+        opt_index = {v: i for i, v in enumerate(options)}
         for p in param_list:
             default = eq_map.get(p, "— skip —")
             choice = st.selectbox(
                 p,
-                ["— skip —"] + tag_list,
+                options,
                 key=f"{equip}_{p}",
-                index=(["— skip —"] + tag_list).index(default) if default in ["— skip —"] + tag_list else 0,
+                index=opt_index.get(default, 0),
             )
             if choice == "— skip —":
                 eq_map.pop(p, None)
@@ -208,20 +237,18 @@ if page == "SysCAD parameters- Map & Populate":
             st.error("Please save a parameter mapping first.")
             st.stop()
 
-        master_bytes.seek(0)
-        stream_bytes.seek(0)
-
         # Pass nested mapping directly
-        populated_stream, missing = populate_syscad_inputs(master_bytes, stream_bytes, mapping_final)
+        populated_bytes, missing = populate_syscad_inputs(
+            BytesIO(master_data), BytesIO(stream_data), mapping_final, common_equipment, missing_equipment
+        )
 
         if missing:
             st.warning("Streamtable missing for: " + ", ".join(missing))
 
-        populated_stream.seek(0)
         fname = f"Master_DataSheet_SysCADPopulated_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.xlsx"
         st.download_button(
             "📥 Download Populated Sheet",
-            data=populated_stream,
+            data=populated_bytes,
             file_name=fname,
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
@@ -1,6 +1,16 @@
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Border, Side
+try:  # fastpyxl is an API-compatible, faster fork of openpyxl
+    from fastpyxl import load_workbook
+    from fastpyxl.styles import Font, Border, Side  # styles must come from the same package as the workbook
+except ImportError:
+    from openpyxl import load_workbook
+    from openpyxl.styles import Font, Border, Side
 from io import BytesIO
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from streamtable_reader import read_streamtable, streamtable_sheetnames
+from syscad_utils import scan_syscad_block
 
 """
 populate_syscad_inputs_rev2.py
@@ -9,83 +19,134 @@ Accepts a **nested mapping**: {equipment_type: {master_param: stream_tag}}
 so each equipment sheet can use its own tag names.
 """
 
-def populate_syscad_inputs(master_file: BytesIO, streamtable_file: BytesIO, mapping_dict: dict):
-    # Load workbooks
-    master_wb = load_workbook(master_file)
-    streamtable_wb = load_workbook(streamtable_file, data_only=True)
+# Styling (shared instances; openpyxl styles are immutable)
+_THIN = Border(
+    left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin")
+)
+_BOLD = Font(bold=True)
+_TWO_DP = "0.00"  # display format for float values; the full value is stored
+
+def _populate_one(master_data: bytes, stream_data: bytes, eq_type: str, param_mapping: dict):
+    """
+    Works out the edits for one equipment sheet without touching the output workbook.
+    Runs in a worker process, so it takes raw bytes and returns plain data:
+    (unit_tags, {(row, col): value}, {row: unit}).
+    """
+    # Streamtable rows (all padded to the sheet width), read straight from the sheet XML
+    stream_sheet = read_streamtable(stream_data, [eq_type])[eq_type]
+
+    # Unit tags (row 1, col D→)
+    stream_header = stream_sheet[0][3:] if stream_sheet else ()
+    stream_unit_tags = [v for v in stream_header if v]
 
-    # Styling
-    thin = Border(
-        left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin")
-    )
+    # unit tag → streamtable column (Excel D=4)
+    stream_unit_col = {v: 4 + i for i, v in enumerate(stream_header) if v}
 
-    master_sheets = set(master_wb.sheetnames)
-    stream_sheets = set(streamtable_wb.sheetnames)
-    common_sheets = master_sheets & stream_sheets
-    missing_sheets = list(master_sheets - stream_sheets)
+    # tag → row values (tag names assumed in column C / index 2)
+    stream_rows = {row[2].strip(): row for row in islice(stream_sheet, 2, None) if len(row) > 2 and row[2]}
 
-    for eq_type in common_sheets:
+    master_wb = load_workbook(BytesIO(master_data), read_only=True, data_only=True, keep_links=False)
+    try:
         master_ws = master_wb[eq_type]
-        stream_ws = streamtable_wb[eq_type]
 
-        # -------- per‑equipment mapping ---------
-        param_mapping = mapping_dict.get(eq_type, {})
-        if not param_mapping:
-            continue  # nothing mapped for this sheet
+        # param → (row, unit) lookup inside SysCAD Inputs block of master sheet
+        _, _, param_rows = scan_syscad_block(master_ws)
+
+        # stream unit tags are written over row 3 (col D→), so the master's own tags only remain past them
+        master_header = next(master_ws.iter_rows(min_row=3, max_row=3, min_col=4, values_only=True), ())
+        master_unit_tags = [v for v in [*stream_unit_tags, *master_header[len(stream_unit_tags):]] if v]
+    finally:
+        master_wb.close()
+
+    # -------- populate values --------
+    # (master row, master unit, stream row values) for every mapping found on both sides
+    resolved = [
+        (*param_rows[master_param], stream_rows[stream_tag])
+        for master_param, stream_tag in param_mapping.items()
+        if master_param in param_rows and stream_tag in stream_rows
+    ]
+    # (master column, stream column) for every unit tag found on both sides
+    columns = [
+        (col_off + 4, stream_unit_col[unit_tag])
+        for col_off, unit_tag in enumerate(master_unit_tags)
+        if unit_tag in stream_unit_col
+    ]
+
+    values, units = {}, {}
+    for m_col, stream_col in columns:
+        for m_row, _, s_vals in resolved:
+            val = s_vals[stream_col - 1]
+            if val is not None:
+                values[(m_row, m_col)] = val
+
+    # update unit if differs (once any unit column matched)
+    if columns:
+        for m_row, master_unit, s_vals in resolved:
+            stream_unit = s_vals[1]  # column B
+            if stream_unit and master_unit != stream_unit:
+                units[m_row] = stream_unit
+
+    return stream_unit_tags, values, units
+
+def populate_syscad_inputs(
+    master_file: BytesIO,
+    streamtable_file: BytesIO,
+    mapping_dict: dict,
+    common_sheets=None,
+    missing_sheets=None,
+):
+    """
+    Returns (populated master as xlsx bytes, missing_sheets).
+    common_sheets / missing_sheets can be passed in when the caller has already
+    compared the two workbooks' sheet names (e.g. the app's analysis step).
+    """
+    master_data = master_file.getvalue()
+    stream_data = streamtable_file.getvalue()
 
-        # Unit tags (row 1, col D→)
-        stream_unit_tags = [c.value for c in stream_ws[1][3:] if c.value]
-        for i, tag in enumerate(stream_unit_tags):
+    # Load the master for writing; formulas are kept (workers read values from their own
+    # data_only copy, and the streamtable per sheet)
+    master_wb = load_workbook(BytesIO(master_data), keep_links=False)
+
+    if common_sheets is None or missing_sheets is None:
+        master_sheets = set(master_wb.sheetnames)
+        stream_sheets = set(streamtable_sheetnames(stream_data))
+        common_sheets = master_sheets & stream_sheets
+        missing_sheets = list(master_sheets - stream_sheets)
+
+    # Only sheets with a mapping are written to
+    mapped_sheets = [eq_type for eq_type in common_sheets if mapping_dict.get(eq_type)]
+    if not mapped_sheets:
+        # Nothing to populate: hand back the master unchanged instead of re-serialising every sheet
+        return master_data, missing_sheets
+
+    # Sheets are independent, so each one is worked out in its own process
+    sheet_mappings = [mapping_dict[eq_type] for eq_type in mapped_sheets]
+    if len(mapped_sheets) > 1:
+        workers = min(len(mapped_sheets), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_populate_one, repeat(master_data), repeat(stream_data), mapped_sheets, sheet_mappings))
+    else:
+        results = [_populate_one(master_data, stream_data, mapped_sheets[0], sheet_mappings[0])]
+
+    # Apply every sheet's edits to the one master workbook
+    for eq_type, (unit_tags, values, units) in zip(mapped_sheets, results):
+        master_ws = master_wb[eq_type]
+
+        for i, tag in enumerate(unit_tags):
             cell = master_ws.cell(row=3, column=4 + i, value=tag)
-            cell.font = Font(bold=True)
-            cell.border = thin
-
-        # tag → row lookup (tag names assumed in column C / index 2)
-        stream_tag_to_row = {
-            row[2].value.strip(): r_idx
-            for r_idx, row in enumerate(stream_ws.iter_rows(min_row=3, max_col=3), start=3)
-            if row[2].value
-        }
-
-        # param → row lookup inside SysCAD Inputs block of master sheet
-        param_rows, in_syscad = {}, False
-        for r in range(1, master_ws.max_row + 1):
-            label = master_ws.cell(row=r, column=1).value
-            if label and "SysCAD Inputs" in str(label):
-                in_syscad = True
-            if in_syscad:
-                if label and "Engineering Inputs" in str(label):
-                    break
-                pname = master_ws.cell(row=r, column=2).value
-                if pname:
-                    param_rows[pname.strip()] = r
-
-        master_unit_tags = [c.value for c in master_ws[3][3:] if c.value]
-
-        # -------- populate values --------
-        for col_off, unit_tag in enumerate(master_unit_tags):
-            if unit_tag not in stream_unit_tags:
-                continue
-            stream_col = stream_unit_tags.index(unit_tag) + 4  # Excel D=4
-            for master_param, stream_tag in param_mapping.items():
-                if master_param not in param_rows or stream_tag not in stream_tag_to_row:
-                    continue
-                m_row = param_rows[master_param]
-                s_row = stream_tag_to_row[stream_tag]
-                val = stream_ws.cell(row=s_row, column=stream_col).value
-                if val is not None:
-                    m_col = col_off + 4
-                    cell = master_ws.cell(row=m_row, column=m_col, value=round(val, 2) if isinstance(val, float) else val)
-                    cell.border = thin
-
-                # update unit if differs
-                stream_unit = stream_ws.cell(row=s_row, column=2).value  # column B
-                master_unit = master_ws.cell(row=m_row, column=3).value
-                if stream_unit and master_unit != stream_unit:
-                    ucell = master_ws.cell(row=m_row, column=3, value=stream_unit)
-                    ucell.border = thin
+            cell.font = _BOLD
+            cell.border = _THIN
+
+        for (m_row, m_col), val in values.items():
+            cell = master_ws.cell(row=m_row, column=m_col, value=val)
+            cell.border = _THIN
+            if isinstance(val, float):
+                cell.number_format = _TWO_DP
+
+        for m_row, unit in units.items():
+            ucell = master_ws.cell(row=m_row, column=3, value=unit)
+            ucell.border = _THIN
 
     buf = BytesIO()
     master_wb.save(buf)
-    buf.seek(0)
-    return buf, missing_sheets
+    return buf.getvalue(), missing_sheets
@@ -0,0 +1,133 @@
+"""
+streamtable_reader.py
+
+Lightweight reader for the SysCAD streamtable workbook.
+
+The app only needs the sheet names and the cell values of the streamtable, so
+instead of building the full openpyxl workbook/cell model this reads the xlsx
+parts directly: the sheet list from xl/workbook.xml, the shared strings once,
+and each requested worksheet with a streaming iterparse that clears every row
+once its values are taken.
+
+Values match what openpyxl returns with data_only=True (cached formula results),
+except that date-formatted numbers are returned as plain numbers.
+"""
+import posixpath
+import zipfile
+from io import BytesIO
+from xml.etree.ElementTree import iterparse, parse
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _column_index(ref):
+    """'D12' → 4"""
+    idx = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + ord(ch.upper()) - 64
+    return idx
+
+
+def _text(elem):
+    """Text of a shared/inline string, joining rich-text runs (phonetic runs skipped)."""
+    parts = []
+    for child in elem:
+        if child.tag == f"{_MAIN}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{_MAIN}r":
+            parts.extend(t.text or "" for t in child.iter(f"{_MAIN}t"))
+    return "".join(parts)
+
+
+def _number(v):
+    return float(v) if any(ch in v for ch in ".eE") else int(v)
+
+
+def _workbook_parts(zf):
+    """{sheet name: worksheet part path} in workbook order, plus the shared strings path."""
+    rels = {
+        rel.get("Id"): (rel.get("Type", ""), rel.get("Target", ""))
+        for rel in parse(zf.open("xl/_rels/workbook.xml.rels")).getroot().iter(f"{_PKG_REL}Relationship")
+    }
+
+    def resolve(target):
+        return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+    sheets = {}
+    for sheet in parse(zf.open("xl/workbook.xml")).getroot().iter(f"{_MAIN}sheet"):
+        rel_type, target = rels.get(sheet.get(f"{_REL}id"), ("", ""))
+        if rel_type.endswith("/worksheet"):  # chartsheets have no cells
+            sheets[sheet.get("name")] = resolve(target)
+
+    shared = next((resolve(t) for rel_type, t in rels.values() if rel_type.endswith("/sharedStrings")), None)
+    return sheets, shared
+
+
+def streamtable_sheetnames(data: bytes):
+    """Worksheet names of the streamtable, in workbook order."""
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        return list(_workbook_parts(zf)[0])
+
+
+def read_streamtable(data: bytes, sheet_names=None):
+    """
+    Returns {sheet name: [row values, ...]} for the requested worksheets (all when None).
+    Row n of the sheet is list index n-1; missing rows and cells are filled with None
+    and every row of a sheet is padded to the same width, like iter_rows(values_only=True).
+    """
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        sheets, shared_part = _workbook_parts(zf)
+        wanted = sheets if sheet_names is None else [n for n in sheet_names if n in sheets]
+
+        shared_strings = []
+        if shared_part and wanted:
+            for _, elem in iterparse(zf.open(shared_part)):
+                if elem.tag == f"{_MAIN}si":
+                    shared_strings.append(_text(elem))
+                    elem.clear()
+
+        return {name: _read_sheet(zf.open(sheets[name]), shared_strings) for name in wanted}
+
+
+def _read_sheet(src, shared_strings):
+    rows, width = [], 0
+    for _, elem in iterparse(src):
+        if elem.tag != f"{_MAIN}row":
+            continue
+
+        r_idx = int(elem.get("r", len(rows) + 1))
+        while len(rows) < r_idx - 1:  # rows with no cells are not written
+            rows.append(())
+
+        values, col = [], 0
+        for c in elem.iter(f"{_MAIN}c"):
+            ref = c.get("r")
+            col = _column_index(ref) if ref else col + 1
+            values.extend([None] * (col - 1 - len(values)))
+
+            t = c.get("t", "n")
+            v = c.findtext(f"{_MAIN}v") or None
+            if t == "inlineStr":
+                is_elem = c.find(f"{_MAIN}is")
+                value = _text(is_elem) if is_elem is not None else None
+            elif v is None:
+                value = None
+            elif t == "s":
+                value = shared_strings[int(v)]
+            elif t == "b":
+                value = v == "1"
+            elif t in ("str", "e", "d"):
+                value = v
+            else:
+                value = _number(v)
+            values.append(value)
+
+        rows.append(tuple(values))
+        width = max(width, len(values))
+        elem.clear()
+
+    return [row + (None,) * (width - len(row)) for row in rows]
@@ -0,0 +1,30 @@
+"""
+syscad_utils.py
+
+Helpers shared by the Streamlit app and the populate backend for locating the
+SysCAD Inputs block of a master datasheet sheet.
+"""
+
+
+def scan_syscad_block(ws):
+    """
+    One pass over columns A–C of a master sheet.
+
+    Returns (syscad_start, eng_start, params):
+    - syscad_start: row of the "SysCAD Inputs" label, or None if the sheet has none
+    - eng_start: row of the "Engineering Inputs" label that ends the block, or None
+    - params: {parameter name: (row, unit)} for the block, in sheet order
+    """
+    syscad_start = eng_start = None
+    params = {}
+    for r, (label, pname, unit) in enumerate(ws.iter_rows(min_col=1, max_col=3, values_only=True), start=1):
+        if label and syscad_start is None and "SysCAD Inputs" in str(label):
+            syscad_start = r
+        if syscad_start is None:
+            continue
+        if label and "Engineering Inputs" in str(label):
+            eng_start = r
+            break
+        if pname:
+            params[pname.strip()] = (r, unit)
+    return syscad_start, eng_start, params